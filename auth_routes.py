@@ -1,30 +1,100 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
 from models import db, User, VerificationCode
-from email_service import send_verification_email, send_welcome_email
+from email_service import send_verification_email_async, send_welcome_email_async
+from cache_service import cache
+from json_provider import StaticJSONResponse
+import config
+import bcrypt
+import orjson
+import os
 import re
+import uuid
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 auth_bp = Blueprint('auth', __name__)
 
+# Bounded pool for bcrypt checks so concurrent logins never run more
+# hashes at once than there are cores
+_hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='bcrypt')
+
+# Checked against when the email is unknown, so a missing user costs the same
+# bcrypt time as a wrong password and login timing does not reveal accounts
+_DUMMY_HASH = bcrypt.hashpw(b'dummy-password', bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS))
+
+# Frequent constant error responses, encoded once at import
+_ERR = {
+    'email_required': StaticJSONResponse(400, 'Bad Request', 'A valid email is required'),
+    'already_verified': StaticJSONResponse(400, 'Bad Request', 'User is already verified'),
+    'invalid_credentials': StaticJSONResponse(401, 'Unauthorized', 'Invalid email or password'),
+    'user_not_found': StaticJSONResponse(404, 'Not Found', 'User not found'),
+    'too_many_requests': StaticJSONResponse(
+        429, 'Too Many Requests',
+        'A verification code was sent recently. Please wait before requesting another.'
+    ),
+    'internal_error': StaticJSONResponse(500, 'Internal Server Error', 'An unexpected error occurred')
+}
+
+# Validation patterns, compiled once at import
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    # Reject obviously malformed input before running the regex
+    if not email or len(email) > 254 or email.count('@') != 1:
+        return False
+    return _EMAIL_RE.match(email) is not None
 
 def validate_password(password):
     """Validate password strength"""
     if len(password) < 8:
         return False, "Password must be at least 8 characters long"
-    if not re.search(r'[A-Z]', password):
+    
+    # Classify characters in a single pass, stopping once every class is seen
+    has_upper = has_lower = has_digit = False
+    for ch in password:
+        if ch.isupper():
+            has_upper = True
+        elif ch.islower():
+            has_lower = True
+        elif ch.isdigit():
+            has_digit = True
+        if has_upper and has_lower and has_digit:
+            break
+    
+    if not has_upper:
         return False, "Password must contain at least one uppercase letter"
-    if not re.search(r'[a-z]', password):
+    if not has_lower:
         return False, "Password must contain at least one lowercase letter"
-    if not re.search(r'\d', password):
+    if not has_digit:
         return False, "Password must contain at least one number"
     return True, "Password is valid"
 
+def _get_email(data):
+    """Return the normalized email from request data, or None if missing or invalid"""
+    email = (data.get('email') or '').strip().lower()
+    if not email or not validate_email(email):
+        return None
+    return email
+
+def _can_issue_code(email):
+    """Claim the resend cooldown for an email; False if a code was issued recently"""
+    return cache.add(f'vcode:{email}', 1, timeout=config.VERIFICATION_RESEND_COOLDOWN)
+
+def _invalidate_old_codes(user_id):
+    """Mark all unused email verification codes for a user as used in one UPDATE"""
+    return VerificationCode.query.filter_by(
+        user_id=user_id,
+        code_type='email_verification',
+        is_used=False
+    ).update({'is_used': True}, synchronize_session=False)
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     """User registration endpoint"""
@@ -42,7 +112,7 @@ def signup():
                 }), 400
         
         full_name = data['full_name'].strip()
-        email = data['email'].strip().lower()
+        email = _get_email(data)
         password = data['password']
         confirm_password = data['confirm_password']
         
@@ -54,7 +124,7 @@ def signup():
                 'error': 'Full name must be at least 2 characters long'
             }), 400
         
-        if not validate_email(email):
+        if email is None:
             return jsonify({
                 'status': 400,
                 'message': 'Bad Request',
@@ -76,77 +146,59 @@ def signup():
                 'error': password_message
             }), 400
         
-        # Check if user already exists
-        existing_user = User.query.filter_by(email=email).first()
-        if existing_user:
-            # If user exists but is not verified, allow re-signup
-            if not existing_user.is_verified:
-                # Update user info (in case they want to change name or password)
-                existing_user.full_name = full_name
-                existing_user.set_password(password)
-                existing_user.updated_at = datetime.utcnow()
-                
-                # Invalidate old verification codes
-                old_codes = VerificationCode.query.filter_by(
-                    user_id=existing_user.id,
-                    code_type='email_verification',
-                    is_used=False
-                ).all()
-                
-                for code in old_codes:
-                    code.is_used = True
-                
-                # Generate new verification code
-                verification_code = VerificationCode(user_id=existing_user.id)
-                db.session.add(verification_code)
-                db.session.commit()
-                
-                # Send verification email
-                email_sent = send_verification_email(
-                    user_email=existing_user.email,
-                    user_name=existing_user.full_name,
-                    verification_code=verification_code.code
-                )
-                
-                if not email_sent:
-                    logging.error(f"Failed to send verification email to {existing_user.email}")
-                
-                return jsonify({
-                    'status': 200,
-                    'message': 'Account found but not verified. New verification code sent.',
-                    'data': {
-                        'user_id': existing_user.id,
-                        'email': existing_user.email,
-                        'verification_required': True,
-                        'email_sent': email_sent,
-                        'is_existing_user': True
-                    }
-                }), 200
-            else:
-                # User exists and is verified
-                return jsonify({
-                    'status': 409,
-                    'message': 'Conflict',
-                    'error': 'User with this email already exists and is verified. Please try logging in instead.'
-                }), 409
-        
-        # Create new user
-        user = User(
+        # Create the user, or refresh an unverified one, in a single atomic
+        # upsert. Verified users are left untouched and return no row.
+        now = datetime.utcnow()
+        password_hash = User.hash_password(password)
+        stmt = insert(User).values(
+            id=str(uuid.uuid4()),
             full_name=full_name,
-            email=email
+            email=email,
+            password_hash=password_hash,
+            is_verified=False,
+            created_at=now,
+            updated_at=now
+        ).on_conflict_do_update(
+            index_elements=[User.email],
+            set_={
+                'full_name': full_name,
+                'password_hash': password_hash,
+                'updated_at': now
+            },
+            where=User.is_verified.is_(False)
+        ).returning(
+            User.id,
+            User.email,
+            User.full_name,
+            literal_column('xmax = 0').label('inserted')
         )
-        user.set_password(password)
-        
-        db.session.add(user)
-        db.session.commit()
+        user = db.session.execute(stmt).first()
         
-        # Generate verification code
+        if user is None:
+            # User exists and is verified
+            db.session.rollback()
+            return jsonify({
+                'status': 409,
+                'message': 'Conflict',
+                'error': 'User with this email already exists and is verified. Please try logging in instead.'
+            }), 409
+        
+        if not user.inserted:
+            # Existing unverified user re-signing up
+            if not _can_issue_code(email):
+                db.session.rollback()
+                return _ERR['too_many_requests']()
+            
+            # Invalidate old verification codes
+            _invalidate_old_codes(user.id)
+        
+        # Generate verification code in the same transaction
         verification_code = VerificationCode(user_id=user.id)
         db.session.add(verification_code)
         db.session.commit()
         
-        # Send verification email
-        email_sent = send_verification_email(
+        # Queue verification email
+        email_sent = send_verification_email_async(
             user_email=user.email,
             user_name=user.full_name,
             verification_code=verification_code.code
@@ -154,7 +206,20 @@ def signup():
         
         if not email_sent:
             # If email fails, we should still return success but log the error
-            logging.error(f"Failed to send verification email to {user.email}")
+            logger.error("Failed to queue verification email to %s", user.email)
+        
+        if not user.inserted:
+            return jsonify({
+                'status': 200,
+                'message': 'Account found but not verified. New verification code sent.',
+                'data': {
+                    'user_id': user.id,
+                    'email': user.email,
+                    'verification_required': True,
+                    'email_sent': email_sent,
+                    'is_existing_user': True
+                }
+            }), 200
         
         return jsonify({
             'status': 201,
@@ -169,7 +234,7 @@ def signup():
         
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Signup error: {str(e)}", exc_info=True)
+        logger.error("Signup error: %s", e, exc_info=True)
         return jsonify({
             'status': 500,
             'message': 'Internal Server Error',
@@ -183,31 +248,23 @@ def verify_email():
         data = request.get_json()
         
         # Validate required fields
-        if not data.get('email') or not data.get('verification_code'):
+        email = _get_email(data)
+        if not email or not data.get('verification_code'):
             return jsonify({
                 'status': 400,
                 'message': 'Bad Request',
-                'error': 'Email and verification code are required'
+                'error': 'A valid email and verification code are required'
             }), 400
         
-        email = data['email'].strip().lower()
         code = data['verification_code'].strip()
         
         # Find user
         user = User.query.filter_by(email=email).first()
         if not user:
-            return jsonify({
-                'status': 404,
-                'message': 'Not Found',
-                'error': 'User not found'
-            }), 404
+            return _ERR['user_not_found']()
         
         if user.is_verified:
-            return jsonify({
-                'status': 400,
-                'message': 'Bad Request',
-                'error': 'User is already verified'
-            }), 400
+            return _ERR['already_verified']()
         
         # Find verification code
         verification = VerificationCode.query.filter_by(
@@ -242,11 +299,14 @@ def verify_email():
         verification.mark_as_used()
         db.session.commit()
         
-        # Send welcome email
-        send_welcome_email(user.email, user.full_name)
+        # Queue welcome email
+        send_welcome_email_async(user.email, user.full_name)
         
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(
+            identity=user.id,
+            additional_claims={'profile': user.to_dict()}
+        )
         
         return jsonify({
             'status': 200,
@@ -259,7 +319,7 @@ def verify_email():
         
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Email verification error: {str(e)}", exc_info=True)
+        logger.error("Email verification error: %s", e, exc_info=True)
         return jsonify({
             'status': 500,
             'message': 'Internal Server Error',
@@ -273,52 +333,66 @@ def login():
         data = request.get_json()
         
         # Validate required fields
-        if not data.get('email') or not data.get('password'):
+        email = _get_email(data)
+        if not email or not data.get('password'):
             return jsonify({
                 'status': 400,
                 'message': 'Bad Request',
-                'error': 'Email and password are required'
+                'error': 'A valid email and password are required'
             }), 400
         
-        email = data['email'].strip().lower()
         password = data['password']
         
         # Find user
         user = User.query.filter_by(email=email).first()
-        if not user or not user.check_password(password):
-            return jsonify({
-                'status': 401,
-                'message': 'Unauthorized',
-                'error': 'Invalid email or password'
-            }), 401
+        if user:
+            password_ok = _hash_pool.submit(user.check_password, password).result()
+        else:
+            _hash_pool.submit(bcrypt.checkpw, password.encode('utf-8'), _DUMMY_HASH).result()
+            password_ok = False
+        
+        if not password_ok:
+            return _ERR['invalid_credentials']()
+        
+        # Bring hashes made under an older cost setting up to date
+        if user.needs_rehash():
+            user.password_hash = _hash_pool.submit(User.hash_password, password).result()
+            db.session.commit()
         
         if not user.is_verified:
+            if not _can_issue_code(email):
+                return jsonify({
+                    'status': 403,
+                    'message': 'Email Not Verified',
+                    'error': 'Please verify your email before logging in. A verification code was sent recently.',
+                    'data': {
+                        'email': user.email,
+                        'verification_required': True,
+                        'can_resend_verification': True,
+                        'email_sent': False,
+                        'auto_sent': False
+                    }
+                }), 403
+            
             # Auto-generate and send new verification code for unverified users
             try:
                 # Invalidate old verification codes
-                old_codes = VerificationCode.query.filter_by(
-                    user_id=user.id,
-                    code_type='email_verification',
-                    is_used=False
-                ).all()
-                
-                for code in old_codes:
-                    code.is_used = True
+                _invalidate_old_codes(user.id)
                 
                 # Generate new verification code
                 verification_code = VerificationCode(user_id=user.id)
                 db.session.add(verification_code)
                 db.session.commit()
                 
-                # Send verification email
-                email_sent = send_verification_email(
+                # Queue verification email
+                email_sent = send_verification_email_async(
                     user_email=user.email,
                     user_name=user.full_name,
                     verification_code=verification_code.code
                 )
                 
                 if not email_sent:
-                    logging.error(f"Failed to send verification email to {user.email} during login")
+                    logger.error("Failed to queue verification email to %s during login", user.email)
                 
                 return jsonify({
                     'status': 403,
@@ -334,7 +408,7 @@ def login():
                 }), 403
                 
             except Exception as e:
-                logging.error(f"Failed to auto-send verification code during login: {str(e)}")
+                logger.error("Failed to auto-send verification code during login: %s", e)
                 return jsonify({
                     'status': 403,
                     'message': 'Email Not Verified',
@@ -349,7 +423,10 @@ def login():
                 }), 403
         
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(
+            identity=user.id,
+            additional_claims={'profile': user.to_dict()}
+        )
         
         return jsonify({
             'status': 200,
@@ -361,7 +438,7 @@ def login():
         }), 200
         
     except Exception as e:
-        logging.error(f"Login error: {str(e)}", exc_info=True)
+        logger.error("Login error: %s", e, exc_info=True)
         return jsonify({
             'status': 500,
             'message': 'Internal Server Error',
@@ -374,61 +451,46 @@ def resend_verification():
     try:
         data = request.get_json()
         
-        if not data.get('email'):
-            return jsonify({
-                'status': 400,
-                'message': 'Bad Request',
-                'error': 'Email is required'
-            }), 400
-        
-        email = data['email'].strip().lower()
+        email = _get_email(data)
+        if not email:
+            return _ERR['email_required']()
         
-        # Find user
-        user = User.query.filter_by(email=email).first()
+        # Find user (read-only, so load just the columns used below)
+        user = db.session.query(
+            User.id, User.email, User.full_name, User.is_verified
+        ).filter_by(email=email).first()
         if not user:
-            return jsonify({
-                'status': 404,
-                'message': 'Not Found',
-                'error': 'User not found'
-            }), 404
+            return _ERR['user_not_found']()
         
         if user.is_verified:
-            return jsonify({
-                'status': 400,
-                'message': 'Bad Request',
-                'error': 'User is already verified'
-            }), 400
+            return _ERR['already_verified']()
         
-        # Invalidate old verification codes
-        old_codes = VerificationCode.query.filter_by(
-            user_id=user.id,
-            code_type='email_verification',
-            is_used=False
-        ).all()
+        if not _can_issue_code(email):
+            return _ERR['too_many_requests']()
         
-        for code in old_codes:
-            code.is_used = True
+        # Invalidate old verification codes
+        _invalidate_old_codes(user.id)
         
         # Generate new verification code
         verification_code = VerificationCode(user_id=user.id)
         db.session.add(verification_code)
         db.session.commit()
         
-        # Send verification email
-        email_sent = send_verification_email(
+        # Queue verification email
+        email_sent = send_verification_email_async(
             user_email=user.email,
             user_name=user.full_name,
             verification_code=verification_code.code
         )
         
         if not email_sent:
-            logging.error(f"Failed to send verification email to {user.email} via resend endpoint")
+            logger.error("Failed to queue verification email to %s via resend endpoint", user.email)
         else:
-            logging.info(f"Verification email sent successfully to {user.email} via resend endpoint")
+            logger.info("Verification email queued for %s via resend endpoint", user.email)
         
         return jsonify({
             'status': 200,
-            'message': 'Verification code sent successfully' if email_sent else 'Verification code generated but email sending failed',
+            'message': 'Verification code sent successfully' if email_sent else 'Verification code generated but email could not be queued',
             'data': {
                 'email_sent': email_sent,
                 'verification_code_generated': True
@@ -437,43 +499,58 @@ def resend_verification():
         
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Resend verification error: {str(e)}", exc_info=True)
-        return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500
+        logger.error("Resend verification error: %s", e, exc_info=True)
+        return _ERR['internal_error']()
+
+@cache.memoize(timeout=60)
+def _profile_json(user_id, version):
+    """
+    Serialized profile response for a user.
+    Keyed by updated_at, so any change to the user row produces a new entry.
+    """
+    user = User.query.get(user_id)
+    return orjson.dumps({
+        'status': 200,
+        'message': 'Profile retrieved successfully',
+        'data': {
+            'user': user.to_dict()
+        }
+    })
 
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     """Get user profile endpoint"""
     try:
+        # Serve the profile embedded in the token unless fresh data is requested;
+        # access tokens are short-lived, which bounds staleness
+        profile = get_jwt().get('profile')
+        if profile and request.args.get('fresh') != '1':
+            return jsonify({
+                'status': 200,
+                'message': 'Profile retrieved successfully',
+                'data': {
+                    'user': profile
+                }
+            }), 200
+        
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         
-        if not user:
-            return jsonify({
-                'status': 404,
-                'message': 'Not Found',
-                'error': 'User not found'
-            }), 404
+        # Cheap single-column lookup used as the cache version
+        row = db.session.query(User.updated_at).filter_by(id=user_id).first()
+        if row is None:
+            return _ERR['user_not_found']()
         
-        return jsonify({
-            'status': 200,
-            'message': 'Profile retrieved successfully',
-            'data': {
-                'user': user.to_dict()
-            }
-        }), 200
+        version = row.updated_at.isoformat() if row.updated_at else ''
+        return current_app.response_class(
+            _profile_json(user_id, version),
+            status=200,
+            mimetype='application/json'
+        )
         
     except Exception as e:
-        logging.error(f"Get profile error: {str(e)}", exc_info=True)
-        return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500
+        logger.error("Get profile error: %s", e, exc_info=True)
+        return _ERR['internal_error']()
 
 @auth_bp.route('/check-user-status', methods=['POST'])
 def check_user_status():
@@ -481,17 +558,14 @@ def check_user_status():
     try:
         data = request.get_json()
         
-        if not data.get('email'):
-            return jsonify({
-                'status': 400,
-                'message': 'Bad Request',
-                'error': 'Email is required'
-            }), 400
+        email = _get_email(data)
+        if not email:
+            return _ERR['email_required']()
         
-        email = data['email'].strip().lower()
-        
-        # Find user
-        user = User.query.filter_by(email=email).first()
+        # Fetch only the columns needed for the status response
+        user = db.session.query(
+            User.email, User.full_name, User.is_verified
+        ).filter_by(email=email).first()
         if not user:
             return jsonify({
                 'status': 404,
@@ -515,9 +589,5 @@ def check_user_status():
         }), 200
         
     except Exception as e:
-        logging.error(f"Check user status error: {str(e)}", exc_info=True)
-        return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500 
\ No newline at end of file
+        logger.error("Check user status error: %s", e, exc_info=True)
+        return _ERR['internal_error']() 
\ No newline at end of file
@@ -1,192 +1,149 @@
 from flask_mail import Mail, Message
 from flask import current_app
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
 
 mail = Mail()
 
-def send_verification_email(user_email, user_name, verification_code):
+# Mail settings captured once by init_email_service()
+_MAIL_CFG = {}
+
+def init_email_service(app):
+    """Initialize Flask-Mail and cache the mail settings used on the send path"""
+    mail.init_app(app)
+    _MAIL_CFG.update({
+        'server': app.config.get('MAIL_SERVER'),
+        'port': app.config.get('MAIL_PORT'),
+        'use_tls': app.config.get('MAIL_USE_TLS'),
+        'use_ssl': app.config.get('MAIL_USE_SSL'),
+        'username': app.config.get('MAIL_USERNAME'),
+        'password': app.config.get('MAIL_PASSWORD')
+    })
+
+# Email templates are loaded and compiled once at import; HTML templates
+# autoescape the user-supplied name
+_template_env = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'emails')),
+    autoescape=select_autoescape(['html'])
+)
+_VERIFY_HTML_TMPL = _template_env.get_template('verify.html')
+_VERIFY_TEXT_TMPL = _template_env.get_template('verify.txt')
+_WELCOME_HTML_TMPL = _template_env.get_template('welcome.html')
+_WELCOME_TEXT_TMPL = _template_env.get_template('welcome.txt')
+
+# Outgoing messages are drained by one background worker that keeps a single
+# SMTP connection open while there is traffic, so TLS and AUTH are paid once
+# per burst rather than once per message
+_SMTP_IDLE_TIMEOUT = 30  # seconds before an idle connection is closed
+_mail_queue = queue.Queue()
+_mail_worker = None
+_mail_worker_lock = threading.Lock()
+
+def _drain_mail_queue(app):
+    """Send queued messages, reusing one SMTP connection until the queue goes idle"""
+    with app.app_context():
+        while True:
+            msg, description = _mail_queue.get()
+            try:
+                with mail.connect() as conn:
+                    while msg is not None:
+                        try:
+                            conn.send(msg)
+                            logger.info("%s sent successfully to %s", description, msg.recipients[0])
+                        except Exception as e:
+                            logger.error("Failed to send %s to %s: %s", description.lower(), msg.recipients[0], e)
+                            raise
+                        try:
+                            msg, description = _mail_queue.get(timeout=_SMTP_IDLE_TIMEOUT)
+                        except queue.Empty:
+                            msg = None
+            except Exception as e:
+                logger.error("SMTP connection error: %s", e)
+
+def _ensure_mail_worker(app):
+    """Start the background mail worker on first use"""
+    global _mail_worker
+    with _mail_worker_lock:
+        if _mail_worker is None or not _mail_worker.is_alive():
+            _mail_worker = threading.Thread(
+                target=_drain_mail_queue, args=(app,), name='mail-worker', daemon=True
+            )
+            _mail_worker.start()
+
+def _enqueue(msg, description):
+    """Queue a message for the background worker, returning True if it was queued"""
+    if msg is None:
+        return False
+    _ensure_mail_worker(current_app._get_current_object())
+    _mail_queue.put((msg, description))
+    return True
+
+def _build_verification_message(user_email, user_name, verification_code):
+    """Build the verification email, or return None if email is not configured"""
+    # Check if email is properly configured
+    if not _MAIL_CFG.get('username') or not _MAIL_CFG.get('password'):
+        logger.error("Email not configured properly - MAIL_USERNAME or MAIL_PASSWORD is missing")
+        return None
+    
+    # Log email configuration for debugging (never the password or the code)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Email config - Server: %s, Port: %s, TLS: %s, SSL: %s, Username: %s",
+            _MAIL_CFG['server'], _MAIL_CFG['port'], _MAIL_CFG['use_tls'],
+            _MAIL_CFG['use_ssl'], _MAIL_CFG['username']
+        )
+        logger.debug("Attempting to send verification email to: %s", user_email)
+    
+    # HTML email template
+    html_body = _VERIFY_HTML_TMPL.render(
+        user_name=user_name,
+        verification_code=verification_code
+    )
+    
+    # Plain text version
+    text_body = _VERIFY_TEXT_TMPL.render(
+        user_name=user_name,
+        verification_code=verification_code
+    )
+    
+    return Message(
+        subject="Verify Your Email - Resume NER Parser",
+        recipients=[user_email],
+        html=html_body,
+        body=text_body
+    )
+
+def _build_welcome_message(user_email, user_name):
+    """Build the welcome email sent after successful verification"""
+    return Message(
+        subject="Welcome to Resume NER Parser!",
+        recipients=[user_email],
+        html=_WELCOME_HTML_TMPL.render(user_name=user_name),
+        body=_WELCOME_TEXT_TMPL.render(user_name=user_name)
+    )
+
+def send_verification_email_async(user_email, user_name, verification_code):
     """
-    Send verification email to user
+    Queue a verification email to be sent in the background
     """
     try:
-        # Check if email is properly configured
-        mail_username = current_app.config.get('MAIL_USERNAME')
-        mail_password = current_app.config.get('MAIL_PASSWORD')
-        
-        if not mail_username or not mail_password:
-            logging.error("Email not configured properly - MAIL_USERNAME or MAIL_PASSWORD is missing")
-            return False
-            
-        # Log email configuration for debugging (but don't log password)
-        logging.info(f"Email config - Server: {current_app.config.get('MAIL_SERVER')}, Port: {current_app.config.get('MAIL_PORT')}")
-        logging.info(f"Email config - TLS: {current_app.config.get('MAIL_USE_TLS')}, SSL: {current_app.config.get('MAIL_USE_SSL')}")
-        logging.info(f"Email config - Username: {mail_username}")
-        logging.info(f"Attempting to send verification email to: {user_email}")
-        logging.info(f"Verification code: {verification_code}")
-        
-        subject = "Verify Your Email - Resume NER Parser"
-        
-        # HTML email template
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #2196f3; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .code {{ background-color: #e3f2fd; padding: 15px; text-align: center; font-size: 24px; font-weight: bold; letter-spacing: 3px; margin: 20px 0; border-radius: 5px; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-                .warning {{ background-color: #fff3cd; border: 1px solid #ffeaa7; padding: 10px; border-radius: 5px; margin: 15px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Email Verification</h1>
-                </div>
-                <div class="content">
-                    <h2>Hello {user_name}!</h2>
-                    <p>Thank you for signing up for Resume NER Parser. To complete your registration, please verify your email address using the code below:</p>
-                    
-                    <div class="code">{verification_code}</div>
-                    
-                    <div class="warning">
-                        <strong>⚠️ Important:</strong> This verification code will expire in 3 minutes for security reasons.
-                    </div>
-                    
-                    <p>If you didn't create an account with us, please ignore this email.</p>
-                    
-                    <p>Best regards,<br>Resume NER Parser Team</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated email. Please do not reply to this message.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Plain text version
-        text_body = f"""
-        Hello {user_name}!
-        
-        Thank you for signing up for Resume NER Parser. To complete your registration, please verify your email address using the code below:
-        
-        Verification Code: {verification_code}
-        
-        ⚠️ Important: This verification code will expire in 3 minutes for security reasons.
-        
-        If you didn't create an account with us, please ignore this email.
-        
-        Best regards,
-        Resume NER Parser Team
-        
-        ---
-        This is an automated email. Please do not reply to this message.
-        """
-        
-        msg = Message(
-            subject=subject,
-            recipients=[user_email],
-            html=html_body,
-            body=text_body
-        )
-        
-        mail.send(msg)
-        logging.info(f"Verification email sent successfully to {user_email}")
-        return True
-        
+        msg = _build_verification_message(user_email, user_name, verification_code)
+        return _enqueue(msg, "Verification email")
     except Exception as e:
-        logging.error(f"Failed to send verification email to {user_email}: {str(e)}")
+        logger.error("Could not queue verification email to %s: %s", user_email, e)
         return False
 
-def send_welcome_email(user_email, user_name):
+def send_welcome_email_async(user_email, user_name):
     """
-    Send welcome email after successful verification
+    Queue a welcome email to be sent in the background
     """
     try:
-        subject = "Welcome to Resume NER Parser!"
-        
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4caf50; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .feature {{ background-color: white; padding: 15px; margin: 10px 0; border-radius: 5px; border-left: 4px solid #2196f3; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎉 Welcome to Resume NER Parser!</h1>
-                </div>
-                <div class="content">
-                    <h2>Hello {user_name}!</h2>
-                    <p>Congratulations! Your email has been successfully verified and your account is now active.</p>
-                    
-                    <h3>What you can do now:</h3>
-                    <div class="feature">
-                        <strong>📄 Upload Resume PDFs</strong><br>
-                        Upload your resume in PDF format for AI-powered analysis
-                    </div>
-                    <div class="feature">
-                        <strong>🤖 Extract Entities</strong><br>
-                        Get detailed entity extraction including names, skills, companies, and more
-                    </div>
-                    <div class="feature">
-                        <strong>📊 View Results</strong><br>
-                        See extracted entities in beautiful card layouts and view your original PDF
-                    </div>
-                    
-                    <p>Ready to get started? <a href="http://localhost:3000" style="color: #2196f3; text-decoration: none;">Visit the application</a></p>
-                    
-                    <p>Best regards,<br>Resume NER Parser Team</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated email. Please do not reply to this message.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_body = f"""
-        Hello {user_name}!
-        
-        Congratulations! Your email has been successfully verified and your account is now active.
-        
-        What you can do now:
-        📄 Upload Resume PDFs - Upload your resume in PDF format for AI-powered analysis
-        🤖 Extract Entities - Get detailed entity extraction including names, skills, companies, and more
-        📊 View Results - See extracted entities in beautiful card layouts and view your original PDF
-        
-        Ready to get started? Visit: http://localhost:3000
-        
-        Best regards,
-        Resume NER Parser Team
-        
-        ---
-        This is an automated email. Please do not reply to this message.
-        """
-        
-        msg = Message(
-            subject=subject,
-            recipients=[user_email],
-            html=html_body,
-            body=text_body
-        )
-        
-        mail.send(msg)
-        logging.info(f"Welcome email sent successfully to {user_email}")
-        return True
-        
+        return _enqueue(_build_welcome_message(user_email, user_name), "Welcome email")
     except Exception as e:
-        logging.error(f"Failed to send welcome email to {user_email}: {str(e)}")
-        return False 
\ No newline at end of file
+        logger.error("Could not queue welcome email to %s: %s", user_email, e)
+        return False
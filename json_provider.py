@@ -0,0 +1,29 @@
+import orjson
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by the orjson C encoder"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class StaticJSONResponse:
+    """
+    Constant JSON envelope encoded once at import.
+    Calling it builds a fresh response, so headers are never shared between requests.
+    """
+    
+    def __init__(self, status, message, error):
+        self.status = status
+        self.body = orjson.dumps({
+            'status': status,
+            'message': message,
+            'error': error
+        })
+    
+    def __call__(self):
+        return current_app.response_class(self.body, status=self.status, mimetype='application/json')
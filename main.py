@@ -1,17 +1,26 @@
 from flask import Flask, request, jsonify
 import config
+# Imported before anything that pulls in torch so its thread settings bind
+from memory_optimizer import memory_monitor, optimize_torch_for_cpu, check_memory_limit, get_memory_usage
+import contextlib
+import functools
+import hashlib
 import logging
 import os
+import tempfile
+import uuid
 import minegold
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
-from ner_model_optimized import extract_resume_entities, unload_model
-from models import db, Resume, User
-from email_service import mail
+from ner_model_optimized import extract_resume_entities_async, load_model_lazy, is_model_loaded
+from models import db, Resume, User, stale_job_cutoff
+from email_service import init_email_service
+from cache_service import cache
+from json_provider import OrjsonProvider
 from auth_routes import auth_bp
 from resume_routes import resume_bp
-from memory_optimizer import memory_monitor, optimize_torch_for_cpu, check_memory_limit
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -20,11 +29,13 @@ optimize_torch_for_cpu()
 
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 # Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = config.SQLALCHEMY_TRACK_MODIFICATIONS
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.SQLALCHEMY_ENGINE_OPTIONS
 app.config['JWT_SECRET_KEY'] = config.JWT_SECRET_KEY
 app.config['MAIL_SERVER'] = config.MAIL_SERVER
 app.config['MAIL_PORT'] = config.MAIL_PORT
@@ -33,10 +44,14 @@ app.config['MAIL_USE_SSL'] = config.MAIL_USE_SSL
 app.config['MAIL_USERNAME'] = config.MAIL_USERNAME
 app.config['MAIL_PASSWORD'] = config.MAIL_PASSWORD
 app.config['MAIL_DEFAULT_SENDER'] = config.MAIL_DEFAULT_SENDER
+app.config['CACHE_TYPE'] = config.CACHE_TYPE
+if config.CACHE_REDIS_URL:
+    app.config['CACHE_REDIS_URL'] = config.CACHE_REDIS_URL
 
 # Initialize extensions
 db.init_app(app)
-mail.init_app(app)
+init_email_service(app)
+cache.init_app(app)
 jwt = JWTManager(app)
 
 # Register blueprints
@@ -46,9 +61,15 @@ app.register_blueprint(resume_bp, url_prefix='/api')
 # Configuration
 RAW_FOLDER = config.RAW_FOLDER
 CLEAN_FOLDER = config.CLEAN_FOLDER
+STORED_FOLDER = config.STORED_FOLDER
 LOG_FILE = config.LOG_FILE
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
+UPLOAD_CHUNK_SIZE = 64 * 1024  # 64KB
+NER_MODEL_PATH = "compressed_resume_ner_model_v2.pt"
+# Uploads get a 503 once RSS grows this far past what the process uses with
+# the model loaded. MEMORY_LIMIT_MB sets an absolute limit instead.
+MEMORY_HEADROOM_MB = int(os.getenv('MEMORY_HEADROOM_MB', 250))
 
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
@@ -61,17 +82,99 @@ logging.basicConfig(
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
+# Load the NER model once at startup so no request pays the cold start. With
+# gunicorn --preload this happens in the master and workers share the weights
+# copy-on-write. After a load failure (missing checkpoint, no access to the
+# Hugging Face hub, ...) the model is loaded again by the first upload.
+try:
+    load_model_lazy(NER_MODEL_PATH)
+except Exception as e:
+    logger.warning(f'NER model not loaded at startup: {str(e)}', exc_info=True)
+
+_memory_limit_mb = int(os.getenv('MEMORY_LIMIT_MB', 0)) or None
+
+def upload_memory_limit():
+    """
+    RSS in MB above which uploads are refused, or None while it is unknown.
+    Without MEMORY_LIMIT_MB it is taken from the first reading with the model
+    loaded, so a failed startup load doesn't pin it below the model's size.
+    """
+    global _memory_limit_mb
+    if _memory_limit_mb is None and is_model_loaded():
+        _memory_limit_mb = get_memory_usage() + MEMORY_HEADROOM_MB
+        logger.info(f'Upload memory limit: {_memory_limit_mb:.0f} MB')
+    return _memory_limit_mb
+
+upload_memory_limit()
+
+def fail_stale_jobs():
+    """
+    Mark pending resumes whose NER job can no longer finish as failed. Jobs
+    lost less than NER_JOB_TIMEOUT_MINUTES before this start are reported as
+    failed on read by Resume.job_status once they pass the timeout.
+    """
+    with app.app_context():
+        try:
+            failed = Resume.query.filter(
+                Resume.status == 'pending',
+                Resume.created_at <= stale_job_cutoff()
+            ).update({'status': 'failed'}, synchronize_session=False)
+            db.session.commit()
+            if failed:
+                logger.warning(f'Marked {failed} stale pending resume(s) as failed')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Could not recover stale NER jobs: {str(e)}', exc_info=True)
+        finally:
+            # Don't hand this connection to workers forked after import
+            db.engine.dispose()
+
+fail_stale_jobs()
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def store_entities(resume_id, future):
+    """Record the outcome of a resume's background NER job on its row"""
+    with app.app_context():
+        try:
+            entities, status = future.result(), 'done'
+        except Exception as e:
+            logger.error(f'NER error for resume {resume_id}: {str(e)}', exc_info=True)
+            entities, status = None, 'failed'
+        
+        try:
+            Resume.query.filter_by(id=resume_id).update(
+                {'entities': entities, 'status': status}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Could not store entities for resume {resume_id}: {str(e)}', exc_info=True)
+
+def save_upload(file, filepath):
+    """Stream an upload to disk in fixed-size chunks, returning its size and SHA-256."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(filepath, 'wb') as out:
+        while True:
+            chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+            out.write(chunk)
+    return size, digest.hexdigest()
+
 @app.route('/minedata', methods=['POST'])
 @jwt_required()
 @memory_monitor
 def process_file():
     try:
         # Check memory before processing
-        if check_memory_limit(450):
+        memory_limit = upload_memory_limit()
+        if memory_limit is not None and check_memory_limit(memory_limit):
             return jsonify({
                 'status': 503,
                 'message': 'Service Temporarily Unavailable',
@@ -102,89 +205,129 @@ def process_file():
             }), 415
 
         filename = secure_filename(file.filename)
-        filepath = os.path.join(RAW_FOLDER, filename)
         
         os.makedirs(RAW_FOLDER, exist_ok=True)
         
+        # Uploads land under a unique temporary name that the finally below
+        # removes, whether the request succeeds, is rejected or fails
+        with tempfile.NamedTemporaryFile(dir=RAW_FOLDER, suffix='.pdf', delete=False) as tmp:
+            filepath = tmp.name
+        
         try:
-            file.save(filepath)
-        except Exception as e:
-            return jsonify({
-                'status': 500,
-                'message': 'File Save Error',
-                'error': f'Could not save file: {str(e)}'
-            }), 500
+            try:
+                file_size, file_hash = save_upload(file, filepath)
+            except Exception as e:
+                return jsonify({
+                    'status': 500,
+                    'message': 'File Save Error',
+                    'error': f'Could not save file: {str(e)}'
+                }), 500
 
-        try:
-            extracted_text = minegold.process_pdf(filepath)
-            
-            if not extracted_text or len(extracted_text) < 50:
+            logger.debug(f'Saved upload {filename} ({file_size} bytes, sha256 {file_hash})')
+
+            # A re-upload of the same PDF reuses the entities already extracted
+            # for it, or the job still extracting them
+            user_id = get_jwt_identity()
+            existing = Resume.query.filter(
+                Resume.user_id == user_id,
+                Resume.file_sha256 == file_hash,
+                db.or_(
+                    Resume.status == 'done',
+                    db.and_(Resume.status == 'pending', Resume.created_at > stale_job_cutoff())
+                )
+            ).order_by(Resume.created_at.desc()).first()
+            if existing and existing.status == 'done':
                 return jsonify({
-                    'status': 422,
-                    'message': 'Unprocessable Content',
-                    'error': 'PDF is either empty or contains too little text',
-                    'character_count': len(extracted_text) if extracted_text else 0
-                }), 422
+                    'status': 200,
+                    'message': 'Success',
+                    'entities': existing.entities or {},
+                    'resume_id': existing.id,
+                    'job_status': existing.status
+                })
+            if existing:
+                return jsonify({
+                    'status': 202,
+                    'message': 'Accepted',
+                    'resume_id': existing.id,
+                    'job_status': existing.status
+                }), 202
+
+            try:
+                extracted_text = minegold.process_pdf(filepath)
             
-            # Extract entities using compressed NER model
-            entities = extract_resume_entities(extracted_text, model_path="compressed_resume_ner_model_v2.pt")
+                if not extracted_text or len(extracted_text) < 50:
+                    return jsonify({
+                        'status': 422,
+                        'message': 'Unprocessable Content',
+                        'error': 'PDF is either empty or contains too little text',
+                        'character_count': len(extracted_text) if extracted_text else 0
+                    }), 422
             
-            # Unload model to free memory after processing
-            unload_model()
+                # Get current user
+                user = User.query.get(user_id)
             
-            # Get current user
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+                if not user:
+                    return jsonify({
+                        'status': 401,
+                        'message': 'Unauthorized',
+                        'error': 'User not found'
+                    }), 401
             
-            if not user:
-                return jsonify({
-                    'status': 401,
-                    'message': 'Unauthorized',
-                    'error': 'User not found'
-                }), 401
+                # Move the upload into permanent storage; only the path goes in the database
+                stored_dir = os.path.join(STORED_FOLDER, str(user_id))
+                os.makedirs(stored_dir, exist_ok=True)
+                stored_path = os.path.join(stored_dir, f"{uuid.uuid4()}_{filename}")
+                os.replace(filepath, stored_path)
             
-            # Read file data for storage
-            file_data = None
-            try:
-                with open(filepath, 'rb') as f:
-                    import base64
-                    file_content = f.read()
-                    file_data = f"data:application/pdf;base64,{base64.b64encode(file_content).decode('utf-8')}"
-            except Exception as e:
-                logging.warning(f"Could not read file for storage: {str(e)}")
+                # Save the resume as pending; entities are filled in by the NER worker
+                resume = Resume(
+                    user_id=user_id,
+                    filename=filename,
+                    file_path=stored_path,
+                    file_sha256=file_hash,
+                    status='pending'
+                )
             
-            # Save resume to database
-            resume = Resume(
-                user_id=user_id,
-                filename=filename,
-                file_data=file_data,
-                entities=entities
-            )
+                db.session.add(resume)
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    os.remove(stored_path)
+                    raise
             
-            db.session.add(resume)
-            db.session.commit()
+                # Extraction is batched with other pending resumes off the request thread
+                future = extract_resume_entities_async(extracted_text, model_path=NER_MODEL_PATH)
+                future.add_done_callback(functools.partial(store_entities, resume.id))
             
-            # Clean up uploaded file
-            try:
-                os.remove(filepath)
-            except Exception as e:
-                logging.warning(f"Could not remove uploaded file: {str(e)}")
-                
-            return jsonify({
-                'status': 200,
-                'message': 'Success',
-                'entities': entities,
-                'resume_id': resume.id
-            })
+                # Clients poll GET /api/resumes/<resume_id> until its status is 'done'
+                return jsonify({
+                    'status': 202,
+                    'message': 'Accepted',
+                    'resume_id': resume.id,
+                    'job_status': 'pending'
+                }), 202
 
-        except Exception as e:
-            logger.error(f'Processing error: {str(e)}', exc_info=True)
-            return jsonify({
-                'status': 500,
-                'message': 'PDF Processing Failed',
-                'error': f'Could not process PDF: {str(e)}'
-            }), 500
+            except Exception as e:
+                logger.error(f'Processing error: {str(e)}', exc_info=True)
+                return jsonify({
+                    'status': 500,
+                    'message': 'PDF Processing Failed',
+                    'error': f'Could not process PDF: {str(e)}'
+                }), 500
+        finally:
+            # Already gone if it was moved into storage
+            with contextlib.suppress(OSError):
+                os.unlink(filepath)
 
+    except RequestEntityTooLarge:
+        # Flask enforces MAX_CONTENT_LENGTH while parsing the form, so this is
+        # raised by the first access to request.files
+        return jsonify({
+            'status': 413,
+            'message': 'Payload Too Large',
+            'error': 'File exceeds the 5MB upload limit'
+        }), 413
     except Exception as e:
         logger.critical(f'Server error: {str(e)}', exc_info=True)
         return jsonify({
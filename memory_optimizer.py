@@ -1,14 +1,31 @@
 import os
 import gc
 import psutil
+
+# Thread settings for OpenMP/MKL only bind if they are in the environment
+# before torch is first imported, so they are set at import time here.
+PHYSICAL_CORES = psutil.cpu_count(logical=False) or (os.cpu_count() or 2) // 2 or 1
+os.environ.setdefault('OMP_NUM_THREADS', str(PHYSICAL_CORES))
+os.environ.setdefault('MKL_NUM_THREADS', str(PHYSICAL_CORES))
+os.environ.setdefault('KMP_AFFINITY', 'granularity=fine,compact,1,0')
+os.environ.setdefault('KMP_BLOCKTIME', '1')
+
 import torch
 import logging
 from functools import wraps
 
+# Per-call memory logging is only wanted when debugging memory usage
+_MEM_DEBUG = os.getenv('MEM_DEBUG') == '1'
+
+# Constructing a Process parses /proc, so one is created up front and reused
+_PROCESS = psutil.Process(os.getpid())
+
 def get_memory_usage():
     """Get current memory usage in MB"""
-    process = psutil.Process(os.getpid())
-    return process.memory_info().rss / 1024 / 1024
+    global _PROCESS
+    if _PROCESS.pid != os.getpid():  # Forked worker (e.g. gunicorn --preload)
+        _PROCESS = psutil.Process(os.getpid())
+    return _PROCESS.memory_info().rss / 1024 / 1024
 
 def log_memory_usage(func_name):
     """Log memory usage before and after function execution"""
@@ -23,7 +40,10 @@ def cleanup_memory():
         torch.cuda.empty_cache()
 
 def memory_monitor(func):
-    """Decorator to monitor memory usage of functions"""
+    """Decorator to monitor memory usage of functions (enabled with MEM_DEBUG=1)"""
+    if not _MEM_DEBUG:
+        return func
+    
     @wraps(func)
     def wrapper(*args, **kwargs):
         memory_before = log_memory_usage(func.__name__)
@@ -49,13 +69,12 @@ def check_memory_limit(limit_mb=450):
 
 def optimize_torch_for_cpu():
     """Set PyTorch optimizations for CPU-only inference"""
-    torch.set_num_threads(1)  # Use single thread to save memory
+    # Intra-op parallelism across physical cores; thread count barely affects RSS
+    torch.set_num_threads(int(os.environ['OMP_NUM_THREADS']))
     torch.set_num_interop_threads(1)
     
     # Disable autograd for inference
     torch.set_grad_enabled(False)
     
     # Set memory management
-    os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:128'
-    os.environ['OMP_NUM_THREADS'] = '1'
-    os.environ['MKL_NUM_THREADS'] = '1' 
\ No newline at end of file
+    os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:128' 
\ No newline at end of file
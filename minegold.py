@@ -2,7 +2,6 @@ import os
 import io
 import re
 import logging
-import string
 from unidecode import unidecode
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.converter import TextConverter
@@ -13,53 +12,71 @@ warnings.filterwarnings('ignore')
 
 logger = logging.getLogger(__name__)
 
+# Cleaning patterns, compiled once at import
+_HYPHEN_BREAK_RE = re.compile(r'(\w+)-\s*\n\s*(\w+)')
+_SPACED_HYPHEN_RE = re.compile(r'\s+-\s+')
+_WS_RE = re.compile(r'\s+')
+_SYMBOL_RUN_RE = re.compile(r'[_\-\|/+~*=]{2,}')
+_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s@.,!?&%$#()\-]')
+_HEADER_FOOTER_RE = re.compile('|'.join((
+    r'\bpage\s*\d+\b',
+    r'\bconfidential\b',
+    r'\b\d{1,2}/\d{1,2}/\d{4}\b',
+    r'^[\s\S]{0,50}resume[\s\S]{0,50}$',
+)), re.IGNORECASE)
+# Contact details, URLs, bullets and long digit runs, removed in one scan
+_CONTACT_INFO_RE = re.compile('|'.join((
+    r'\b(?:email|phone|http[s]?://)\S+\b',
+    r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
+    r'\u2022|\u25CF|\u25E6|\u2043',
+    r'\d{10,}',
+)))
+
+# ASCII control characters except tab, newline and carriage return
+_CONTROL_CHARS_TABLE = dict.fromkeys(
+    [c for c in range(32) if c not in (9, 10, 13)] + [127]
+)
+
 def handle_hyphenation(text):
     """Fix words broken by hyphenation across lines"""
-    text = re.sub(r'(\w+)-\s*\n\s*(\w+)', r'\1\2', text)
-    text = re.sub(r'\s+-\s+', ' ', text)
+    text = _HYPHEN_BREAK_RE.sub(r'\1\2', text)
+    text = _SPACED_HYPHEN_RE.sub(' ', text)
     return text
 
 def clean_whitespace(text):
     """Normalize all whitespace characters"""
     text = text.replace('\xa0', ' ')
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     return text.strip()
 
 def remove_control_characters(text):
     """Remove non-printable control characters"""
-    return ''.join(ch for ch in text if ch not in string.control)
+    return text.translate(_CONTROL_CHARS_TABLE)
 
 def clean_special_chars(text):
     """Handle special characters and symbols"""
-    text = re.sub(r'[_\-\|/+~*=]{2,}', ' ', text)
-    return re.sub(r'[^\w\s@.,!?&%$#()\-]', '', text)
+    text = _SYMBOL_RUN_RE.sub(' ', text)
+    return _DISALLOWED_CHARS_RE.sub('', text)
 
 def remove_header_footer(text):
     """Remove common header/footer patterns"""
-    patterns = [
-        r'\bpage\s*\d+\b',
-        r'\bconfidential\b',
-        r'\b\d{1,2}/\d{1,2}/\d{4}\b',
-        r'^[\s\S]{0,50}resume[\s\S]{0,50}$',
-    ]
-    for pattern in patterns:
-        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
-    return text
+    return _HEADER_FOOTER_RE.sub('', text)
+
+def remove_contact_info(text):
+    """Remove emails, phone/URL fragments, bullets and long digit runs"""
+    return _CONTACT_INFO_RE.sub('', text)
 
 def clean_text_pipeline(text):
     """Text cleaning pipeline"""
     cleaning_steps = [
         remove_control_characters,
         handle_hyphenation,
-        lambda x: unidecode(x),
+        unidecode,
         clean_whitespace,
         remove_header_footer,
         clean_special_chars,
-        lambda x: re.sub(r'\b(?:email|phone|http[s]?://)\S+\b', '', x),
-        lambda x: re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', x),
-        lambda x: re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', x),
-        lambda x: re.sub(r'\u2022|\u25CF|\u25E6|\u2043', ' ', x),
-        lambda x: re.sub(r'\d{10,}', '', x),
+        remove_contact_info,
     ]
     
     for step in cleaning_steps:
@@ -71,13 +88,30 @@ def clean_text_pipeline(text):
             
     return text
 
+class _PageTextWriter(io.TextIOBase):
+    """Text sink for TextConverter that collects output chunks in a list"""
+    
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+    
+    def write(self, s):
+        self.chunks.append(s)
+        return len(s)
+    
+    def pop_text(self):
+        """Return the text written since the last call and reset the buffer"""
+        text = ''.join(self.chunks)
+        self.chunks.clear()
+        return text
+
 def process_pdf(pdf_path):
     """Main PDF processing function with fixed PDFMiner implementation"""
     try:
         logger.info(f"Processing PDF: {pdf_path}")
         
         rsrcmgr = PDFResourceManager()
-        output_stream = io.StringIO()
+        output_stream = _PageTextWriter()
         laparams = LAParams()
         device = TextConverter(rsrcmgr, output_stream, laparams=laparams)
         interpreter = PDFPageInterpreter(rsrcmgr, device)
@@ -86,11 +120,9 @@ def process_pdf(pdf_path):
         with open(pdf_path, 'rb') as fp:
             for page in PDFPage.get_pages(fp):
                 interpreter.process_page(page)
-                page_text = output_stream.getvalue()
+                page_text = output_stream.pop_text()
                 if page_text.strip():
                     full_text.append(clean_text_pipeline(page_text))
-                output_stream.truncate(0)
-                output_stream.seek(0)
         
         device.close()
         output_stream.close()
@@ -98,8 +130,8 @@ def process_pdf(pdf_path):
         if not full_text:
             raise ValueError("No text could be extracted from PDF")
             
-        final_text = ' '.join(full_text)
-        return clean_text_pipeline(final_text)
+        # Pages are already cleaned; joining only needs whitespace normalised
+        return _WS_RE.sub(' ', ' '.join(full_text)).strip()
 
     except Exception as e:
         logger.error(f"PDF Processing Error: {str(e)}", exc_info=True)
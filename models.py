@@ -1,12 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime, timedelta
 import uuid
 import bcrypt
 import secrets
-import string
+import config
 
 db = SQLAlchemy()
 
+_CODE_SPACE = 10 ** 6  # Number of possible 6-digit verification codes
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -22,11 +25,16 @@ class User(db.Model):
     verification_codes = db.relationship('VerificationCode', backref='user', lazy=True, cascade='all, delete-orphan')
     resumes = db.relationship('Resume', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    @staticmethod
+    def hash_password(password):
+        """Return the bcrypt hash for a password"""
+        password_bytes = password.encode('utf-8')
+        salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
+        return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+    
     def set_password(self, password):
         """Hash and set the password"""
-        password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        self.password_hash = self.hash_password(password)
     
     def check_password(self, password):
         """Check if the provided password matches the hash"""
@@ -34,6 +42,12 @@ class User(db.Model):
         hash_bytes = self.password_hash.encode('utf-8')
         return bcrypt.checkpw(password_bytes, hash_bytes)
     
+    def needs_rehash(self):
+        """Whether the stored hash uses a lower cost than BCRYPT_ROUNDS"""
+        # bcrypt hashes look like $2b$<cost>$<salt+hash>. Hashes are only ever
+        # strengthened, so a low-cost instance cannot weaken shared accounts.
+        return int(self.password_hash.split('$')[2]) < config.BCRYPT_ROUNDS
+    
     def to_dict(self):
         """Convert user object to dictionary"""
         return {
@@ -47,17 +61,36 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.email}>'
 
+def stale_job_cutoff():
+    """Creation time before which a pending resume's NER job is treated as lost"""
+    return datetime.utcnow() - timedelta(minutes=config.NER_JOB_TIMEOUT_MINUTES)
+
 class Resume(db.Model):
     __tablename__ = 'resumes'
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
-    file_data = db.Column(db.Text)  # Base64 PDF data
-    entities = db.Column(db.JSON)   # Extracted entities as JSON
+    file_data = db.Column(db.Text)  # Base64 PDF data (resumes saved via the API)
+    file_path = db.Column(db.String(512))  # Stored PDF on disk (uploaded resumes)
+    file_sha256 = db.Column(db.String(64), index=True)  # Digest of the stored PDF, for duplicate detection
+    entities = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))   # Extracted entities (binary JSONB on Postgres)
+    status = db.Column(db.String(16), default='done', server_default='done', nullable=False)  # 'pending', 'done' or 'failed'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Serves "my resumes, newest first"
+    __table_args__ = (
+        db.Index('ix_resumes_user_id_created_at', user_id, created_at.desc()),
+    )
+    
+    @property
+    def job_status(self):
+        """Status as reported to clients; a pending job past the timeout counts as failed"""
+        if self.status == 'pending' and self.created_at and self.created_at <= stale_job_cutoff():
+            return 'failed'
+        return self.status
+    
     def to_dict(self):
         """Convert resume object to dictionary"""
         return {
@@ -65,6 +98,7 @@ class Resume(db.Model):
             'user_id': self.user_id,
             'filename': self.filename,
             'entities': self.entities or {},
+            'status': self.job_status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -92,7 +126,8 @@ class VerificationCode(db.Model):
     @staticmethod
     def generate_code():
         """Generate a 6-digit verification code"""
-        return ''.join(secrets.choice(string.digits) for _ in range(6))
+        # One uniform draw from the OS CSPRNG, zero-padded to six digits
+        return f'{secrets.randbelow(_CODE_SPACE):06d}'
     
     def is_expired(self):
         """Check if the verification code has expired"""
@@ -103,9 +138,8 @@ class VerificationCode(db.Model):
         return not self.is_used and not self.is_expired()
     
     def mark_as_used(self):
-        """Mark the verification code as used"""
+        """Mark the verification code as used (committed by the caller)"""
         self.is_used = True
-        db.session.commit()
     
     def to_dict(self):
         """Convert verification code object to dictionary"""
@@ -1,20 +1,230 @@
-import re
+import contextlib
+import logging
+import threading
+import numpy as np
 import torch
 from transformers import BertTokenizerFast, BertForTokenClassification
 import warnings
 from transformers import logging as transformers_logging
 import os
+import gc
+
+try:
+    import intel_extension_for_pytorch as ipex  # Optional: BF16 kernels for Xeon CPUs
+except ImportError:
+    ipex = None
 
 warnings.filterwarnings('ignore')  # Suppress general warnings
 transformers_logging.set_verbosity_error()  # Suppress transformers warnings
 
-# Then define your extract_resume_entities function...
+logger = logging.getLogger(__name__)
+
+# Define labels based on your training data
+UNIQUE_LABELS = ['COLLEGE NAME', 'COMPANY', 'DEGREE', 'DESIGNATION', 'EMAIL', 'LOCATION', 'NAME', 'SKILLS']
+
+# Add 'O' for non-entity tokens and special tokens
+LABELS = ['O'] + [f'B-{label}' for label in UNIQUE_LABELS] + [f'I-{label}' for label in UNIQUE_LABELS]
+LABEL2ID = {label: i for i, label in enumerate(LABELS)}
+ID2LABEL = {i: label for i, label in enumerate(LABELS)}
+
+# Per-label-id lookup arrays for vectorized BIO decoding. ENT_TYPE indexes
+# UNIQUE_LABELS, with -1 for 'O'.
+IS_B = np.array([label.startswith('B-') for label in LABELS])
+IS_I = np.array([label.startswith('I-') for label in LABELS])
+ENT_TYPE = np.array([UNIQUE_LABELS.index(label[2:]) if label != 'O' else -1 for label in LABELS])
+
+# Window length (matches the max length used during training, including
+# [CLS] and [SEP]) and the token overlap between windows for longer resumes
+MAX_LEN = 256
+WINDOW_OVERLAP = 64
+
+# Loaded (tokenizer, model, device, autocast_dtype) tuples keyed by model path
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def _quantized_path(model_path):
+    """Path of the INT8 checkpoint derived from model_path"""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.int8{ext}"
+
+
+def _source_fingerprint(model_path):
+    """Size and mtime of the source checkpoint, recorded with its INT8 cache"""
+    stat = os.stat(model_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_quantized(quantized_path, model_path, device):
+    """Return the cached INT8 state dict if it was built from model_path as it is now, else None"""
+    if not os.path.exists(quantized_path):
+        return None
+    try:
+        cached = torch.load(quantized_path, map_location=device, weights_only=True)
+    except Exception:
+        return None  # Unreadable cache; it is rebuilt and replaced
+    if not isinstance(cached, dict) or cached.get('source') != _source_fingerprint(model_path):
+        return None  # Older cache format, or the checkpoint was replaced since
+    return cached['state_dict']
+
+
+def _save_quantized(model, quantized_path, model_path):
+    """Write the INT8 cache atomically, so concurrent loaders never read a partial file"""
+    tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+    try:
+        torch.save({'source': _source_fingerprint(model_path), 'state_dict': model.state_dict()}, tmp_path)
+        os.replace(tmp_path, quantized_path)
+    except OSError:
+        # Read-only deployments simply requantize on each start
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+
+
+def _quantize(model):
+    """
+    Apply dynamic INT8 quantization to all Linear layers.
+    LayerNorm, GELU and softmax stay in FP32.
+    """
+    if 'fbgemm' in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = 'fbgemm'  # x86 (AVX2/VNNI) kernels
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _ipex_bf16_supported():
+    """True when IPEX is installed and the CPU has native BF16 support"""
+    return ipex is not None and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+
+
+def _trace(model):
+    """
+    Trace and freeze the model with TorchScript so adjacent ops are fused and
+    Python dispatch is skipped. Falls back to the eager model if tracing fails
+    or the traced graph does not reproduce eager output on a padded batch of
+    another size and length.
+    """
+    example = torch.randint(1000, 2000, (1, MAX_LEN))
+    check = torch.randint(1000, 2000, (2, MAX_LEN // 3))
+    check_mask = torch.ones_like(check)
+    check_mask[1, MAX_LEN // 6:] = 0  # Padded row, as in 'longest'-padded serving batches
+    try:
+        with torch.inference_mode():
+            traced = torch.jit.trace(model, (example, torch.ones_like(example)), strict=False)
+            traced = torch.jit.freeze(traced)
+            expected = model(check, check_mask)['logits']
+            actual = traced(check, check_mask)['logits']
+        if torch.allclose(expected, actual, atol=1e-4):
+            logger.info("NER model running as a frozen TorchScript graph")
+            return traced
+        max_diff = (expected - actual).abs().max().item()
+        logger.warning(f"Traced NER model differs from eager (max logit diff {max_diff:.2e}); using eager model")
+    except Exception as e:
+        logger.warning(f"Could not trace NER model, using eager model: {str(e)}", exc_info=True)
+    return model
+
+
+def _get_model(model_path):
+    """
+    Load the tokenizer and model for model_path once and reuse them on later calls.
+    
+    Args:
+        model_path (str): Path to the compressed model weights
+        
+    Returns:
+        tuple: (tokenizer, model, device, autocast_dtype); autocast_dtype is
+        None unless the forward pass should run under autocast
+    """
+    cached = _MODEL_CACHE.get(model_path)
+    if cached is not None:
+        return cached
+    
+    with _MODEL_CACHE_LOCK:
+        # Another thread may have finished loading while we waited
+        if model_path in _MODEL_CACHE:
+            return _MODEL_CACHE[model_path]
+        
+        # Set device
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        
+        # Load the tokenizer
+        tokenizer = BertTokenizerFast.from_pretrained('bert-base-uncased')
+        
+        # Check if compressed model exists
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Compressed model not found at {model_path}")
+        
+        # Load the base model structure
+        model = BertForTokenClassification.from_pretrained(
+            'bert-base-uncased', 
+            num_labels=len(LABELS),
+            id2label=ID2LABEL,
+            label2id=LABEL2ID
+        )
+        
+        quantized_path = _quantized_path(model_path)
+        
+        # With IPEX on a BF16-capable CPU, run BF16 instead of INT8
+        use_ipex = device.type == 'cpu' and _ipex_bf16_supported()
+        autocast_dtype = torch.bfloat16 if use_ipex else None
+        
+        # Reuse the INT8 weights persisted by a previous start from this same checkpoint
+        quantized_state_dict = None
+        if device.type == 'cpu' and not use_ipex:
+            quantized_state_dict = _load_quantized(quantized_path, model_path, device)
+        
+        quantized = None
+        if quantized_state_dict is not None:
+            model.eval()
+            try:
+                quantized = _quantize(model)
+                quantized.load_state_dict(quantized_state_dict)
+            except Exception as e:
+                # Keys no longer match the model (e.g. after a transformers
+                # upgrade); the cache is discarded and rebuilt from the checkpoint
+                logger.warning(f"Discarding INT8 cache {quantized_path}: {str(e)}")
+                quantized = None
+            del quantized_state_dict
+        
+        if quantized is not None:
+            model = quantized
+        else:
+            # Load the compressed state dict (mixed precision)
+            compressed_state_dict = torch.load(model_path, map_location=device)
+            
+            if device.type == 'cuda':
+                # Run directly in the checkpoint's half precision on GPU
+                model.half()
+            
+            # load_state_dict copies into the existing parameters and casts
+            # dtype in place, so no FP32 copy of the checkpoint is built
+            model.load_state_dict(compressed_state_dict)
+            del compressed_state_dict
+            gc.collect()
+            
+            model.to(device)
+            model.eval()
+            
+            if use_ipex:
+                # oneDNN fused kernels (MHA, LayerNorm) in BF16
+                model = ipex.optimize(model, dtype=torch.bfloat16, level='O1')
+            elif device.type == 'cpu':
+                # INT8 dynamic quantization of Linear layers (CPU only)
+                model = _quantize(model)
+                _save_quantized(model, quantized_path, model_path)
+        
+        # Share weights with worker processes instead of copying them
+        if device.type == 'cpu' and not use_ipex:
+            model.share_memory()
+            model = _trace(model)
+        
+        _MODEL_CACHE[model_path] = (tokenizer, model, device, autocast_dtype)
+        return _MODEL_CACHE[model_path]
 
 
 def extract_resume_entities(resume_text, model_path="compressed_resume_ner_model_v2.pt"):
     """
     Extract and group named entities from resume text using a compressed fine-tuned BERT model.
     Returns only unique entities for each entity type.
+    The model is loaded on the first call for a given model_path and reused afterwards.
     
     Args:
         resume_text (str): The text content of a resume
@@ -23,64 +233,24 @@ def extract_resume_entities(resume_text, model_path="compressed_resume_ner_model
     Returns:
         dict: Dictionary with entity types as keys and lists of unique extracted entities as values
     """
-    # Define labels based on your training data
-    unique_labels = ['COLLEGE NAME', 'COMPANY', 'DEGREE', 'DESIGNATION', 'EMAIL', 'LOCATION', 'NAME', 'SKILLS']
-    
-    # Add 'O' for non-entity tokens and special tokens
-    labels = ['O'] + [f'B-{label}' for label in unique_labels] + [f'I-{label}' for label in unique_labels]
-    label2id = {label: i for i, label in enumerate(labels)}
-    id2label = {i: label for i, label in enumerate(labels)}
-    
-    # Set device
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    
-    # Load the tokenizer
-    tokenizer = BertTokenizerFast.from_pretrained('bert-base-uncased')
-    
-    # Check if compressed model exists
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Compressed model not found at {model_path}")
-    
-    
-    
-    # Load the base model structure
-    model = BertForTokenClassification.from_pretrained(
-        'bert-base-uncased', 
-        num_labels=len(labels),
-        id2label=id2label,
-        label2id=label2id
-    )
-    
-    # Load the compressed state dict (mixed precision)
-    compressed_state_dict = torch.load(model_path, map_location=device)
-    
-    # Convert half precision back to float32 for inference
-    state_dict_fp32 = {}
-    for key, value in compressed_state_dict.items():
-        if value.dtype == torch.float16:
-            state_dict_fp32[key] = value.float()
-        else:
-            state_dict_fp32[key] = value
-    
-    model.load_state_dict(state_dict_fp32)
-    
-    model.to(device)
-    model.eval()
+    tokenizer, model, device, autocast_dtype = _get_model(model_path)
     
     # Tokenize the text
-    tokens = []
-    for match in re.finditer(r'\S+', resume_text):
-        tokens.append(match.group())
+    tokens = resume_text.split()
     
-    # Prepare input for the model
-    MAX_LEN = 256  # Match the max length used during training
+    if not tokens:
+        return {}
+    
+    # Prepare input for the model. No padding: a single sequence runs at its
+    # true length. Longer resumes are split into overlapping windows.
     inputs = tokenizer(
         tokens,
         is_split_into_words=True,
-        return_offsets_mapping=True,
-        padding='max_length',
         truncation=True,
         max_length=MAX_LEN,
+        stride=WINDOW_OVERLAP,
+        return_overflowing_tokens=True,
+        padding='longest',
         return_tensors='pt'
     )
     
@@ -89,69 +259,38 @@ def extract_resume_entities(resume_text, model_path="compressed_resume_ner_model
     attention_mask = inputs['attention_mask'].to(device)
     
     # Get model predictions
-    with torch.no_grad():
-        outputs = model(input_ids=input_ids, attention_mask=attention_mask)
-        predictions = torch.argmax(outputs.logits, dim=2)
-    
-    # Convert predictions to labels
-    predicted_labels = []
-    word_ids = inputs.word_ids(0)  # Batch index 0
-    previous_word_idx = None
-    
-    for idx, word_idx in enumerate(word_ids):
-        if word_idx is None or word_idx == previous_word_idx:
-            continue
-        
-        if idx < len(predictions[0]):
-            predicted_labels.append(id2label[predictions[0, idx].item()])
-        else:
-            predicted_labels.append('O')
-            
-        previous_word_idx = word_idx
+    with torch.inference_mode(), torch.autocast(
+        device.type, dtype=autocast_dtype or torch.bfloat16, enabled=autocast_dtype is not None
+    ):
+        outputs = model(input_ids, attention_mask)
+        predictions = torch.argmax(outputs['logits'], dim=2).cpu()
     
-    # Truncate predictions if needed
-    predicted_labels = predicted_labels[:len(tokens)]
+    # One label per word, taken from its first sub-token. Windows are
+    # flattened in order, so np.unique's first index keeps the label from the
+    # first window a word appears in.
+    word_ids = np.array(
+        [-1 if w is None else w for window in range(predictions.shape[0]) for w in inputs.word_ids(window)]
+    ).reshape(predictions.shape)
+    first_subword = (word_ids >= 0) & (word_ids != np.roll(word_ids, 1, axis=1))
+    words, first_idx = np.unique(word_ids[first_subword], return_index=True)
+    label_ids = np.zeros(len(tokens), dtype=np.int64)  # 0 is 'O'
+    label_ids[words] = predictions.numpy()[first_subword][first_idx]
     
-    # Combine tokens and predictions
-    token_predictions = list(zip(tokens, predicted_labels))
+    # Spans start at a B- tag, or at an I- tag whose type differs from the
+    # previous word's; they run while words stay inside an entity.
+    ent = ENT_TYPE[label_ids]
+    in_span = ent >= 0
+    prev_ent = np.concatenate(([-1], ent[:-1]))
+    starts = IS_B[label_ids] | (IS_I[label_ids] & (ent != prev_ent))
+    continues = np.concatenate((in_span[1:] & ~starts[1:], [False]))
+    span_starts = np.flatnonzero(starts)
+    span_ends = np.flatnonzero(in_span & ~continues) + 1
     
     # Group entities by type
     entities_with_duplicates = {}
-    current_entity = None
-    current_text = []
-    
-    for token, label in token_predictions:
-        if label == 'O':
-            if current_entity:
-                if current_entity not in entities_with_duplicates:
-                    entities_with_duplicates[current_entity] = []
-                entities_with_duplicates[current_entity].append(' '.join(current_text))
-                current_entity = None
-                current_text = []
-        elif label.startswith('B-'):
-            if current_entity:
-                if current_entity not in entities_with_duplicates:
-                    entities_with_duplicates[current_entity] = []
-                entities_with_duplicates[current_entity].append(' '.join(current_text))
-            current_entity = label[2:]  # Remove B- prefix
-            current_text = [token]
-        elif label.startswith('I-'):
-            if current_entity == label[2:]:  # Only append if it's the same entity type
-                current_text.append(token)
-            else:
-                # Start a new entity if the I- tag doesn't match current entity
-                if current_entity:
-                    if current_entity not in entities_with_duplicates:
-                        entities_with_duplicates[current_entity] = []
-                    entities_with_duplicates[current_entity].append(' '.join(current_text))
-                current_entity = label[2:]
-                current_text = [token]
-    
-    # Add the last entity if there is one
-    if current_entity and current_text:
-        if current_entity not in entities_with_duplicates:
-            entities_with_duplicates[current_entity] = []
-        entities_with_duplicates[current_entity].append(' '.join(current_text))
+    for start, end in zip(span_starts, span_ends):
+        entity_type = UNIQUE_LABELS[ent[start]]
+        entities_with_duplicates.setdefault(entity_type, []).append(' '.join(tokens[start:end]))
     
     # Remove duplicates while preserving order
     entities = {}
@@ -160,10 +299,13 @@ def extract_resume_entities(resume_text, model_path="compressed_resume_ner_model
         cleaned_mentions = [m.strip().rstrip(',') for m in mentions]
         
         # Remove duplicates while preserving order
+        seen = set()
         unique_mentions = []
         for m in cleaned_mentions:
             # Case-insensitive comparison to better catch duplicates
-            if not any(m.lower() == existing.lower() for existing in unique_mentions):
+            key = m.lower()
+            if key not in seen:
+                seen.add(key)
                 unique_mentions.append(m)
         
         entities[entity_type] = unique_mentions
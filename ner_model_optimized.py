@@ -1,4 +1,13 @@
 import re
+import contextlib
+import logging
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
 import torch
 from transformers import BertTokenizerFast, BertForTokenClassification
 import warnings
@@ -9,6 +18,39 @@ import gc
 warnings.filterwarnings('ignore')
 transformers_logging.set_verbosity_error()
 
+logger = logging.getLogger(__name__)
+
+# x86 INT8 GEMM kernels for the dynamically quantized Linear layers
+if 'fbgemm' in torch.backends.quantized.supported_engines:
+    torch.backends.quantized.engine = 'fbgemm'
+
+# Labels the model was trained with
+UNIQUE_LABELS = ['COLLEGE NAME', 'COMPANY', 'DEGREE', 'DESIGNATION', 'EMAIL', 'LOCATION', 'NAME', 'SKILLS']
+LABELS = ['O'] + [f'B-{label}' for label in UNIQUE_LABELS] + [f'I-{label}' for label in UNIQUE_LABELS]
+LABEL2ID = {label: i for i, label in enumerate(LABELS)}
+ID2LABEL = {i: label for i, label in enumerate(LABELS)}
+
+# Per-label-id lookup arrays for vectorized BIO decoding. ENT_TYPE indexes
+# UNIQUE_LABELS, with -1 for 'O'.
+IS_B = np.array([label.startswith('B-') for label in LABELS])
+IS_I = np.array([label.startswith('I-') for label in LABELS])
+ENT_TYPE = np.array([UNIQUE_LABELS.index(label[2:]) if label != 'O' else -1 for label in LABELS])
+
+# Limit token length to save memory
+MAX_LEN = 128  # Reduced from 256
+
+# Micro-batching of concurrent extraction requests
+BATCH_SIZE = 8
+BATCH_WINDOW = 0.02  # seconds to wait for more requests after the first
+_requests = queue.Queue()
+_batch_thread = None
+_batch_thread_lock = threading.Lock()
+
+# Recent results keyed by (model_path, SHA-1 of the text), least recent first
+RESULT_CACHE_SIZE = 256
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+
 # Global variables to avoid reloading
 _model = None
 _tokenizer = None
@@ -20,6 +62,80 @@ def clear_memory():
         torch.cuda.empty_cache()
     gc.collect()
 
+def _quantized_path(model_path):
+    """Path of the INT8 checkpoint saved alongside model_path"""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.int8{ext}"
+
+def _quantize(model):
+    """Dynamic INT8 quantization of Linear layers; LayerNorm, GELU and softmax stay FP32"""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _trace(model):
+    """
+    Trace and freeze the model with TorchScript to skip Python dispatch and
+    fold constants. The frozen graph is warmed up on a second, padded batch
+    and must match eager output there, otherwise the eager model is kept.
+    """
+    example = torch.randint(1000, 2000, (1, MAX_LEN))
+    check = torch.randint(1000, 2000, (2, 40))
+    check_mask = torch.ones_like(check)
+    check_mask[1, 25:] = 0  # Padded row, as in 'longest'-padded serving batches
+    try:
+        with torch.inference_mode():
+            traced = torch.jit.trace(model, (example, torch.ones_like(example)), strict=False)
+            traced = torch.jit.freeze(traced)
+            expected = model(check, check_mask)['logits']
+            for _ in range(2):  # Warm-up runs let the profiling executor specialise
+                actual = traced(check, check_mask)['logits']
+        if torch.allclose(expected, actual, atol=1e-4):
+            logger.info("NER model running as a frozen TorchScript graph")
+            return traced
+        max_diff = (expected - actual).abs().max().item()
+        logger.warning(f"Traced NER model differs from eager (max logit diff {max_diff:.2e}); using eager model")
+    except Exception as e:
+        logger.warning(f"Could not trace NER model, using eager model: {str(e)}", exc_info=True)
+    return model
+
+def _load_weights(path):
+    """
+    Load a state dict with its tensors memory-mapped, so pages are read only
+    as load_state_dict copies them. Checkpoints in the legacy (non-zip)
+    format cannot be mapped and are read in full.
+    """
+    try:
+        return torch.load(path, map_location=_device, mmap=True, weights_only=True)
+    except RuntimeError:
+        return torch.load(path, map_location=_device, weights_only=True)
+
+def _source_fingerprint(model_path):
+    """Size and mtime of the source checkpoint, recorded with its INT8 cache"""
+    stat = os.stat(model_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _load_quantized(quantized_path, model_path):
+    """Return the cached INT8 state dict if it was built from model_path as it is now, else None"""
+    if not os.path.exists(quantized_path):
+        return None
+    try:
+        cached = _load_weights(quantized_path)
+    except Exception:
+        return None  # Unreadable cache; it is rebuilt and replaced
+    if not isinstance(cached, dict) or cached.get('source') != _source_fingerprint(model_path):
+        return None  # Older cache format, or the checkpoint was replaced since
+    return cached['state_dict']
+
+def _save_quantized(model, quantized_path, model_path):
+    """Write the INT8 cache atomically, so concurrent loaders never read a partial file"""
+    tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+    try:
+        torch.save({'source': _source_fingerprint(model_path), 'state_dict': model.state_dict()}, tmp_path)
+        os.replace(tmp_path, quantized_path)
+    except OSError:
+        # Read-only deployments simply requantize on each start
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+
 def load_model_lazy(model_path="compressed_resume_ner_model_v2.pt"):
     """Load model and tokenizer only when needed"""
     global _model, _tokenizer, _device
@@ -27,177 +143,208 @@ def load_model_lazy(model_path="compressed_resume_ner_model_v2.pt"):
     if _model is not None:
         return _model, _tokenizer, _device
     
-    # Define labels
-    unique_labels = ['COLLEGE NAME', 'COMPANY', 'DEGREE', 'DESIGNATION', 'EMAIL', 'LOCATION', 'NAME', 'SKILLS']
-    labels = ['O'] + [f'B-{label}' for label in unique_labels] + [f'I-{label}' for label in unique_labels]
-    label2id = {label: i for i, label in enumerate(labels)}
-    id2label = {i: label for i, label in enumerate(labels)}
-    
     # Force CPU usage to save memory
     _device = torch.device('cpu')
     
-    # Load tokenizer
-    _tokenizer = BertTokenizerFast.from_pretrained('bert-base-uncased')
+    # The tokenizer and model are built in locals and published only once
+    # fully loaded, so a failed load leaves nothing half-built behind and is
+    # retried on the next call
+    tokenizer = BertTokenizerFast.from_pretrained('bert-base-uncased')
     
     # Check model exists
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model not found at {model_path}")
     
     # Load model with memory optimization
-    _model = BertForTokenClassification.from_pretrained(
+    model = BertForTokenClassification.from_pretrained(
         'bert-base-uncased',
-        num_labels=len(labels),
-        id2label=id2label,
-        label2id=label2id,
+        num_labels=len(LABELS),
+        id2label=ID2LABEL,
+        label2id=LABEL2ID,
         low_cpu_mem_usage=True  # Optimize memory usage
     )
     
-    # Load compressed weights
-    compressed_state_dict = torch.load(model_path, map_location=_device)
+    # Reuse the INT8 weights saved by a previous start from this same checkpoint
+    quantized_path = _quantized_path(model_path)
+    quantized_state_dict = _load_quantized(quantized_path, model_path)
+    quantized = None
+    if quantized_state_dict is not None:
+        model.eval()
+        try:
+            quantized = _quantize(model)
+            quantized.load_state_dict(quantized_state_dict)
+        except Exception as e:
+            # Keys no longer match the model (e.g. after a transformers
+            # upgrade); the cache is discarded and rebuilt from the checkpoint
+            logger.warning(f"Discarding INT8 cache {quantized_path}: {str(e)}")
+            quantized = None
+        del quantized_state_dict
+    if quantized is not None:
+        model = quantized
+    else:
+        # Load compressed weights
+        compressed_state_dict = _load_weights(model_path)
+        
+        # load_state_dict copies into the existing FP32 parameters and casts
+        # dtype in place, so no FP32 copy of the checkpoint is built
+        model.load_state_dict(compressed_state_dict)
+        model.to(_device)
+        model.eval()
+        
+        # Run Linear layers as INT8 GEMMs and keep the result for later starts
+        model = _quantize(model)
+        _save_quantized(model, quantized_path, model_path)
+        
+        # Clear temporary variables
+        del compressed_state_dict
+    
+    _model, _tokenizer = _trace(model), tokenizer
+    
+    return _model, _tokenizer, _device
+
+def is_model_loaded():
+    """True once load_model_lazy has published a fully loaded model"""
+    return _model is not None
+
+# A whitespace-delimited word starting at a given offset
+_WORD_RE = re.compile(r'\S+')
+
+def _split_words(text, offsets):
+    """
+    Recover whitespace-delimited words from the tokenizer's character offsets
+    (an (L, 2) array). Returns the words and the index of each word's first
+    sub-token.
+    """
+    # [CLS], [SEP] and padding have empty offsets
+    idx = np.flatnonzero(offsets[:, 0] != offsets[:, 1])
+    if not len(idx):
+        return [], idx
+    starts = offsets[idx, 0]
+    ends = offsets[idx, 1]
+    
+    # Candidate word starts: sub-tokens not touching the previous one
+    gaps = np.flatnonzero(starts[1:] > ends[:-1]) + 1
+    
+    # Sub-tokens separated only by whitespace belong to different words
+    first = [0] + [k for k in gaps.tolist() if text[ends[k - 1]:starts[k]].isspace()]
+    words = [_WORD_RE.match(text, start).group() for start in starts[first].tolist()]
+    
+    return words, idx[first]
+
+def _group_entities(tokens, label_ids):
+    """Group one sequence's per-word BIO predictions into unique entities per type"""
+    if not tokens:
+        return {}
+    
+    # Spans start at a B- tag, or at an I- tag whose type differs from the
+    # previous word's; they run while words stay inside an entity.
+    ent = ENT_TYPE[label_ids]
+    in_span = ent >= 0
+    prev_ent = np.concatenate(([-1], ent[:-1]))
+    starts = IS_B[label_ids] | (IS_I[label_ids] & (ent != prev_ent))
+    continues = np.concatenate((in_span[1:] & ~starts[1:], [False]))
+    span_starts = np.flatnonzero(starts)
+    span_ends = np.flatnonzero(in_span & ~continues) + 1
+    
+    # Group entities
+    entities_with_duplicates = {}
+    for start, end in zip(span_starts, span_ends):
+        entity_type = UNIQUE_LABELS[ent[start]]
+        entities_with_duplicates.setdefault(entity_type, []).append(' '.join(tokens[start:end]))
+    
+    # Remove duplicates
+    entities = {}
+    for entity_type, mentions in entities_with_duplicates.items():
+        cleaned_mentions = [m.strip().rstrip(',') for m in mentions]
+        seen = set()
+        unique_mentions = []
+        for m in cleaned_mentions:
+            key = m.lower()
+            if key not in seen:
+                seen.add(key)
+                unique_mentions.append(m)
+        entities[entity_type] = unique_mentions
     
-    # Convert to float32 efficiently
-    state_dict_fp32 = {}
-    for key, value in compressed_state_dict.items():
-        if value.dtype == torch.float16:
-            state_dict_fp32[key] = value.float()
+    return entities
+
+def _cache_key(resume_text, model_path):
+    return model_path, hashlib.sha1(resume_text.encode('utf-8')).hexdigest()
+
+def _cache_get(key):
+    """Return a fresh copy of a cached entities dict, or None"""
+    with _result_cache_lock:
+        cached = _result_cache.get(key)
+        if cached is None:
+            return None
+        _result_cache.move_to_end(key)
+    return {entity_type: list(mentions) for entity_type, mentions in cached}
+
+def _cache_put(key, entities):
+    """Store an entities dict as immutable tuples, evicting the least recent entry"""
+    with _result_cache_lock:
+        _result_cache[key] = tuple((entity_type, tuple(mentions)) for entity_type, mentions in entities.items())
+        _result_cache.move_to_end(key)
+        if len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+def extract_resume_entities_batch(resume_texts, model_path="compressed_resume_ner_model_v2.pt"):
+    """
+    Extract entities for several resumes with a single forward pass.
+    Returns one entities dict per input text, in order.
+    """
+    # Texts without any words, or seen recently, skip the model
+    results = [{} for _ in resume_texts]
+    batch_indices = []
+    cache_keys = {}
+    for i, resume_text in enumerate(resume_texts):
+        if not resume_text.strip():
+            continue
+        cache_keys[i] = _cache_key(resume_text, model_path)
+        cached = _cache_get(cache_keys[i])
+        if cached is not None:
+            results[i] = cached
         else:
-            state_dict_fp32[key] = value
+            batch_indices.append(i)
+    if not batch_indices:
+        return results
+    batch_texts = [resume_texts[i] for i in batch_indices]
     
-    _model.load_state_dict(state_dict_fp32)
-    _model.to(_device)
-    _model.eval()
+    # Load model lazily
+    model, tokenizer, device = load_model_lazy(model_path)
     
-    # Clear temporary variables
-    del compressed_state_dict, state_dict_fp32
-    clear_memory()
+    # Tokenize the raw text once; word boundaries come from the offsets
+    inputs = tokenizer(
+        batch_texts,
+        return_offsets_mapping=True,
+        padding='longest',  # Pad only to the longest resume in the batch
+        truncation=True,
+        max_length=MAX_LEN,
+        return_tensors='pt'
+    )
     
-    return _model, _tokenizer, _device
+    # Move to device
+    input_ids = inputs['input_ids'].to(device)
+    attention_mask = inputs['attention_mask'].to(device)
+    
+    # Get predictions with memory optimization
+    with torch.inference_mode():
+        outputs = model(input_ids, attention_mask)
+        predictions = torch.argmax(outputs['logits'], dim=2).numpy()
+    
+    offset_mapping = inputs['offset_mapping'].numpy()
+    for row, i in enumerate(batch_indices):
+        tokens, first_subtokens = _split_words(batch_texts[row], offset_mapping[row])
+        label_ids = predictions[row, first_subtokens]
+        results[i] = _group_entities(tokens, label_ids)
+        _cache_put(cache_keys[i], results[i])
+    
+    return results
 
 def extract_resume_entities(resume_text, model_path="compressed_resume_ner_model_v2.pt"):
     """
     Extract entities with optimized memory usage
     """
-    try:
-        # Load model lazily
-        model, tokenizer, device = load_model_lazy(model_path)
-        
-        # Define labels
-        unique_labels = ['COLLEGE NAME', 'COMPANY', 'DEGREE', 'DESIGNATION', 'EMAIL', 'LOCATION', 'NAME', 'SKILLS']
-        labels = ['O'] + [f'B-{label}' for label in unique_labels] + [f'I-{label}' for label in unique_labels]
-        id2label = {i: label for i, label in enumerate(labels)}
-        
-        # Tokenize with smaller chunks to save memory
-        tokens = []
-        for match in re.finditer(r'\S+', resume_text):
-            tokens.append(match.group())
-        
-        # Limit token length to save memory
-        MAX_LEN = 128  # Reduced from 256
-        if len(tokens) > MAX_LEN - 2:  # Account for [CLS] and [SEP]
-            tokens = tokens[:MAX_LEN - 2]
-        
-        # Tokenize
-        inputs = tokenizer(
-            tokens,
-            is_split_into_words=True,
-            return_offsets_mapping=True,
-            padding='max_length',
-            truncation=True,
-            max_length=MAX_LEN,
-            return_tensors='pt'
-        )
-        
-        # Move to device
-        input_ids = inputs['input_ids'].to(device)
-        attention_mask = inputs['attention_mask'].to(device)
-        
-        # Get predictions with memory optimization
-        with torch.no_grad():
-            outputs = model(input_ids=input_ids, attention_mask=attention_mask)
-            predictions = torch.argmax(outputs.logits, dim=2)
-        
-        # Move results to CPU immediately to free GPU memory
-        predictions = predictions.cpu()
-        
-        # Clear GPU memory
-        del input_ids, attention_mask, outputs
-        clear_memory()
-        
-        # Process predictions
-        predicted_labels = []
-        word_ids = inputs.word_ids(0)
-        previous_word_idx = None
-        
-        for idx, word_idx in enumerate(word_ids):
-            if word_idx is None or word_idx == previous_word_idx:
-                continue
-            
-            if idx < len(predictions[0]):
-                predicted_labels.append(id2label[predictions[0, idx].item()])
-            else:
-                predicted_labels.append('O')
-                
-            previous_word_idx = word_idx
-        
-        # Truncate predictions
-        predicted_labels = predicted_labels[:len(tokens)]
-        
-        # Group entities
-        entities_with_duplicates = {}
-        current_entity = None
-        current_text = []
-        
-        for token, label in zip(tokens, predicted_labels):
-            if label == 'O':
-                if current_entity:
-                    if current_entity not in entities_with_duplicates:
-                        entities_with_duplicates[current_entity] = []
-                    entities_with_duplicates[current_entity].append(' '.join(current_text))
-                    current_entity = None
-                    current_text = []
-            elif label.startswith('B-'):
-                if current_entity:
-                    if current_entity not in entities_with_duplicates:
-                        entities_with_duplicates[current_entity] = []
-                    entities_with_duplicates[current_entity].append(' '.join(current_text))
-                current_entity = label[2:]
-                current_text = [token]
-            elif label.startswith('I-'):
-                if current_entity == label[2:]:
-                    current_text.append(token)
-                else:
-                    if current_entity:
-                        if current_entity not in entities_with_duplicates:
-                            entities_with_duplicates[current_entity] = []
-                        entities_with_duplicates[current_entity].append(' '.join(current_text))
-                    current_entity = label[2:]
-                    current_text = [token]
-        
-        # Add last entity
-        if current_entity and current_text:
-            if current_entity not in entities_with_duplicates:
-                entities_with_duplicates[current_entity] = []
-            entities_with_duplicates[current_entity].append(' '.join(current_text))
-        
-        # Remove duplicates
-        entities = {}
-        for entity_type, mentions in entities_with_duplicates.items():
-            cleaned_mentions = [m.strip().rstrip(',') for m in mentions]
-            unique_mentions = []
-            for m in cleaned_mentions:
-                if not any(m.lower() == existing.lower() for existing in unique_mentions):
-                    unique_mentions.append(m)
-            entities[entity_type] = unique_mentions
-        
-        # Final memory cleanup
-        clear_memory()
-        
-        return entities
-        
-    except Exception as e:
-        # Clean up on error
-        clear_memory()
-        raise e
+    return extract_resume_entities_batch([resume_text], model_path)[0]
 
 def unload_model():
     """Unload model to free memory when not needed"""
@@ -212,4 +359,54 @@ def unload_model():
         _tokenizer = None
     
     _device = None
-    clear_memory() 
\ No newline at end of file
+    clear_memory()
+
+def _run_batch(batch):
+    """Run one forward pass per model path in the batch and resolve its futures"""
+    by_model = {}
+    for resume_text, model_path, future in batch:
+        # Skip requests whose caller already gave up on them
+        if future.set_running_or_notify_cancel():
+            by_model.setdefault(model_path, []).append((resume_text, future))
+    
+    for model_path, items in by_model.items():
+        try:
+            results = extract_resume_entities_batch([text for text, _ in items], model_path)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+        else:
+            for (_, future), entities in zip(items, results):
+                future.set_result(entities)
+
+def _batch_worker():
+    """Collect up to BATCH_SIZE requests within BATCH_WINDOW and run them together"""
+    while True:
+        batch = [_requests.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _run_batch(batch)
+
+def extract_resume_entities_async(resume_text, model_path="compressed_resume_ner_model_v2.pt"):
+    """
+    Queue a resume for batched entity extraction.
+    Returns a concurrent.futures.Future resolving to the entities dict.
+    """
+    global _batch_thread
+    
+    if _batch_thread is None:
+        with _batch_thread_lock:
+            if _batch_thread is None:
+                _batch_thread = threading.Thread(target=_batch_worker, name='ner-batch', daemon=True)
+                _batch_thread.start()
+    
+    future = Future()
+    _requests.put((resume_text, model_path, future))
+    return future
@@ -1,43 +1,61 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Resume, User
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from models import db, Resume
+from json_provider import StaticJSONResponse
+import base64
+import io
 import logging
+import os
 from datetime import datetime
 
 resume_bp = Blueprint('resume', __name__)
 
+# Page size for the resume listing
+RESUMES_PAGE_SIZE = 50
+
+# Frequent constant error responses, encoded once at import
+_ERR = {
+    'user_not_found': StaticJSONResponse(404, 'User not found', 'User not found'),
+    'internal_error': StaticJSONResponse(500, 'Internal Server Error', 'An unexpected error occurred')
+}
+
 @resume_bp.route('/resumes', methods=['GET'])
 @jwt_required()
 def get_user_resumes():
     """Get all resumes for the authenticated user"""
     try:
+        # A valid token is enough; a deleted user simply has no resumes
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         
-        if not user:
-            return jsonify({
-                'status': 404,
-                'message': 'User not found',
-                'error': 'User not found'
-            }), 404
+        limit = min(max(request.args.get('limit', RESUMES_PAGE_SIZE, type=int), 1), RESUMES_PAGE_SIZE)
+        offset = max(request.args.get('offset', 0, type=int), 0)
         
-        resumes = Resume.query.filter_by(user_id=user_id).order_by(Resume.created_at.desc()).all()
+        # The listing never needs the base64 PDF, so it is not loaded
+        resumes = (
+            Resume.query.options(defer(Resume.file_data))
+            .filter_by(user_id=user_id)
+            .order_by(Resume.created_at.desc())
+            .limit(limit)
+            .offset(offset)
+            .all()
+        )
         
         return jsonify({
             'status': 200,
             'message': 'Resumes retrieved successfully',
             'data': {
-                'resumes': [resume.to_dict() for resume in resumes]
+                'resumes': [resume.to_dict() for resume in resumes],
+                'limit': limit,
+                'offset': offset
             }
         }), 200
         
     except Exception as e:
         logging.error(f"Get resumes error: {str(e)}", exc_info=True)
-        return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500
+        return _ERR['internal_error']()
 
 @resume_bp.route('/resumes', methods=['POST'])
 @jwt_required()
@@ -45,14 +63,6 @@ def save_resume():
     """Save a new resume for the authenticated user"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({
-                'status': 404,
-                'message': 'User not found',
-                'error': 'User not found'
-            }), 404
         
         data = request.get_json()
         
@@ -80,7 +90,12 @@ def save_resume():
         )
         
         db.session.add(resume)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The users foreign key rejects tokens whose user no longer exists
+            db.session.rollback()
+            return _ERR['user_not_found']()
         
         return jsonify({
             'status': 201,
@@ -93,11 +108,7 @@ def save_resume():
     except Exception as e:
         db.session.rollback()
         logging.error(f"Save resume error: {str(e)}", exc_info=True)
-        return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500
+        return _ERR['internal_error']()
 
 @resume_bp.route('/resumes/<resume_id>', methods=['GET'])
 @jwt_required()
@@ -106,7 +117,7 @@ def get_resume(resume_id):
     try:
         user_id = get_jwt_identity()
         
-        resume = Resume.query.filter_by(id=resume_id, user_id=user_id).first()
+        resume = Resume.query.options(defer(Resume.file_data)).filter_by(id=resume_id, user_id=user_id).first()
         
         if not resume:
             return jsonify({
@@ -115,25 +126,58 @@ def get_resume(resume_id):
                 'error': 'Resume not found or you do not have permission to access it'
             }), 404
         
-        # Include file_data in response for PDF viewing
-        resume_data = resume.to_dict()
-        resume_data['file_data'] = resume.file_data
-        
+        # The PDF itself is served as raw bytes by GET /resumes/<id>/pdf
         return jsonify({
             'status': 200,
             'message': 'Resume retrieved successfully',
             'data': {
-                'resume': resume_data
+                'resume': resume.to_dict()
             }
         }), 200
         
     except Exception as e:
         logging.error(f"Get resume error: {str(e)}", exc_info=True)
+        return _ERR['internal_error']()
+
+@resume_bp.route('/resumes/<resume_id>/pdf', methods=['GET'])
+@resume_bp.route('/resumes/<resume_id>/file', methods=['GET'])
+@jwt_required()
+def get_resume_file(resume_id):
+    """Serve the PDF of a resume for the authenticated user as raw bytes"""
+    try:
+        user_id = get_jwt_identity()
+        
+        resume = db.session.query(
+            Resume.filename, Resume.file_path, Resume.file_data
+        ).filter_by(id=resume_id, user_id=user_id).first()
+        
+        if resume and resume.file_path and os.path.exists(resume.file_path):
+            return send_file(
+                resume.file_path,
+                mimetype='application/pdf',
+                download_name=resume.filename
+            )
+        
+        if resume and resume.file_data:
+            # Resumes saved through the API keep base64 data, possibly as a data URL
+            encoded = resume.file_data
+            if encoded.startswith('data:'):
+                encoded = encoded.split(',', 1)[-1]
+            return send_file(
+                io.BytesIO(base64.b64decode(encoded)),
+                mimetype='application/pdf',
+                download_name=resume.filename
+            )
+        
         return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500
+            'status': 404,
+            'message': 'File not found',
+            'error': 'Resume file not found or you do not have permission to access it'
+        }), 404
+        
+    except Exception as e:
+        logging.error(f"Get resume file error: {str(e)}", exc_info=True)
+        return _ERR['internal_error']()
 
 @resume_bp.route('/resumes/<resume_id>', methods=['DELETE'])
 @jwt_required()
@@ -142,17 +186,29 @@ def delete_resume(resume_id):
     try:
         user_id = get_jwt_identity()
         
-        resume = Resume.query.filter_by(id=resume_id, user_id=user_id).first()
+        # One DELETE that hands back the stored file path; no SELECT or ORM load
+        deleted = db.session.execute(
+            delete(Resume)
+            .where(Resume.id == resume_id, Resume.user_id == user_id)
+            .returning(Resume.file_path)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
         
-        if not resume:
+        if not deleted:
             return jsonify({
                 'status': 404,
                 'message': 'Resume not found',
                 'error': 'Resume not found or you do not have permission to delete it'
             }), 404
         
-        db.session.delete(resume)
-        db.session.commit()
+        # Remove the stored PDF once the row is gone
+        file_path = deleted.file_path
+        if file_path:
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                logging.warning(f"Could not remove stored file: {str(e)}")
         
         return jsonify({
             'status': 200,
@@ -162,11 +218,7 @@ def delete_resume(resume_id):
     except Exception as e:
         db.session.rollback()
         logging.error(f"Delete resume error: {str(e)}", exc_info=True)
-        return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500
+        return _ERR['internal_error']()
 
 @resume_bp.route('/resumes/<resume_id>', methods=['PUT'])
 @jwt_required()
@@ -208,8 +260,4 @@ def update_resume(resume_id):
     except Exception as e:
         db.session.rollback()
         logging.error(f"Update resume error: {str(e)}", exc_info=True)
-        return jsonify({
-            'status': 500,
-            'message': 'Internal Server Error',
-            'error': 'An unexpected error occurred'
-        }), 500 
\ No newline at end of file
+        return _ERR['internal_error']() 
\ No newline at end of file
@@ -7,9 +7,32 @@ This script creates all necessary database tables
 import os
 import sys
 from flask import Flask
+from sqlalchemy import inspect, text
 from models import db, User, Resume, VerificationCode
 import config
 
+# Statements that bring tables created by an older version of the models up
+# to date, keyed by the schema version that introduced them. create_all()
+# never alters existing tables, so every column change needs an entry here.
+# Each statement is idempotent, so a partly applied upgrade can be re-run.
+MIGRATIONS = {
+    2: [
+        "ALTER TABLE resumes ADD COLUMN IF NOT EXISTS file_path VARCHAR(512)",
+        "ALTER TABLE resumes ADD COLUMN IF NOT EXISTS file_sha256 VARCHAR(64)",
+        "ALTER TABLE resumes ADD COLUMN IF NOT EXISTS status VARCHAR(16) NOT NULL DEFAULT 'done'",
+        "ALTER TABLE resumes ALTER COLUMN entities TYPE jsonb USING entities::jsonb",
+    ],
+}
+
+# Add a MIGRATIONS entry whenever the models change
+SCHEMA_VERSION = max(MIGRATIONS)
+
+# Single-row table recording the SCHEMA_VERSION the database was set up with
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, nullable=False)
+)
+
 def create_app():
     """Create Flask app with database configuration"""
     app = Flask(__name__)
@@ -17,27 +40,61 @@ def create_app():
     # Configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = config.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.SQLALCHEMY_ENGINE_OPTIONS
     
     # Initialize database
     db.init_app(app)
     
     return app
 
+def get_schema_version():
+    """Return the recorded schema version, or None for a fresh database"""
+    if not inspect(db.engine).has_table('schema_version'):
+        return None
+    return db.session.execute(db.select(schema_version.c.version)).scalar()
+
 def setup_database():
     """Create all database tables"""
     app = create_app()
     
     with app.app_context():
         try:
+            # Skip the metadata scan entirely when the schema is already current
+            current_version = get_schema_version() or 0
+            if current_version == SCHEMA_VERSION:
+                print(f"✅ Database schema already at version {SCHEMA_VERSION}, nothing to do.")
+                return
+            
             # Create all tables
             db.create_all()
             print("✅ Database tables created successfully!")
             
+            # Upgrade tables that already existed before their columns can be indexed
+            for version in sorted(MIGRATIONS):
+                if version > current_version:
+                    for statement in MIGRATIONS[version]:
+                        db.session.execute(text(statement))
+                    db.session.commit()
+                    print(f"✅ Applied schema migration {version}")
+            
+            # create_all skips tables that already exist, so add any indexes
+            # introduced since they were created (e.g. resumes by user and date)
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=db.engine, checkfirst=True)
+            print("✅ Database indexes up to date!")
+            
+            # Record the version so later runs can skip setup
+            db.session.execute(schema_version.delete())
+            db.session.execute(schema_version.insert().values(version=SCHEMA_VERSION))
+            db.session.commit()
+            
             # Print table information
             print("\n📊 Created tables:")
             print("  - users (stores user accounts)")
             print("  - verification_codes (stores email verification codes)")
             print("  - resumes (stores uploaded resumes and extracted entities)")
+            print("  - schema_version (records the applied schema version)")
             
             print(f"\n🔗 Database URL: {config.SQLALCHEMY_DATABASE_URI}")
             print("\n🚀 Database setup complete! You can now start the application.")
@@ -8,7 +8,7 @@ echo "Installing Python dependencies..."
 pip install -r requirements.txt
 
 # Make migrations and setup database
-python setup_database.py
+python setup_database.py || { echo "Database setup failed, not starting the application."; exit 1; }
 
 # Start the Flask application
 python main.py 
\ No newline at end of file